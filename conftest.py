@@ -1,13 +1,44 @@
-
 import sys, os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import sqlite3
 import pytest
 import database as db
+import library_service
+
+def build_template(path, with_sample_data):
+    # Create the schema (and optionally the sample data) once in a template file
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(db, "DATABASE", str(path))
+        db.init_database()
+        if with_sample_data:
+            db.add_sample_data()
+    return path
+
+@pytest.fixture(scope="session")
+def schema_template(tmp_path_factory):
+    return build_template(tmp_path_factory.mktemp("templates") / "schema.sqlite", False)
+
+@pytest.fixture(scope="session")
+def seeded_template(tmp_path_factory):
+    return build_template(tmp_path_factory.mktemp("templates") / "seeded.sqlite", True)
+
+@pytest.fixture
+def restore_db(tmp_path, monkeypatch):
+    def restore(template):
+        # Give this test its own copy of the template instead of re-running init_database()
+        target = str(tmp_path / "test.sqlite")
+        source, copy = sqlite3.connect(str(template)), sqlite3.connect(target)
+        source.backup(copy)
+        source.close()
+        copy.close()
+        monkeypatch.setattr(db, "DATABASE", target)
+        db.pool.reset()  # drop pooled connections to the previous test's file
+        library_service.clear_patron_report_cache()
+    return restore
 
 @pytest.fixture(autouse=True)
-def fresh_db(tmp_path, monkeypatch):
-    # Use a brand-new SQLite file for this test run
-    monkeypatch.setattr(db, "DATABASE", str(tmp_path / "test.sqlite"))
-    db.init_database()  # create empty tables
-    yield
\ No newline at end of file
+def fresh_db(seeded_template, restore_db):
+    # Start every test from the seeded sample catalog
+    restore_db(seeded_template)
+    yield
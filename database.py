@@ -3,12 +3,31 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 # Database configuration
 DATABASE = 'library.db'
+POOL_SIZE = 4
+POOL_TIMEOUT = 10.0  # seconds to wait for a free pooled connection
+
+# Per-connection tuning; journal_mode=WAL also persists in the database file
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-64000',
+)
+
+def apply_pragmas(conn):
+    """Apply the tuning PRAGMAs to a freshly opened connection."""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
 
 def get_db_connection():
     """Get a database connection."""
@@ -16,9 +35,103 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
+class PooledConnection(sqlite3.Connection):
+    """A connection that remembers which pool queue issued it."""
+    pool_queue = None
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of SQLite connections kept open across requests.
+    The queue holds one slot per connection; an empty slot (None) is opened on the next get().
+    """
+
+    def __init__(self, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._connections = None
+        self._lock = threading.Lock()
+
+    def _connect(self, connections: queue.Queue) -> PooledConnection:
+        """Open a pooled connection for the given queue and apply the per-connection PRAGMAs."""
+        conn = sqlite3.connect(DATABASE, check_same_thread=False, factory=PooledConnection)
+        try:
+            conn.row_factory = sqlite3.Row
+            apply_pragmas(conn)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        conn.pool_queue = connections
+        return conn
+
+    def _queue(self) -> queue.Queue:
+        """Return the current connection queue, creating its empty slots on first use."""
+        with self._lock:
+            if self._connections is None:
+                connections = queue.Queue(maxsize=self.size)
+                for _ in range(self.size):
+                    connections.put_nowait(None)
+                self._connections = connections
+            return self._connections
+
+    def get(self) -> PooledConnection:
+        """Take a connection out of the pool, waiting up to timeout seconds if all are in use."""
+        connections = self._queue()
+        try:
+            conn = connections.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(
+                f"No database connection became free within {self.timeout} seconds."
+            ) from None
+        if conn is None:
+            try:
+                conn = self._connect(connections)
+            except BaseException:
+                connections.put_nowait(None)  # give the slot back so the pool keeps its size
+                raise
+        return conn
+
+    def put(self, conn: PooledConnection):
+        """Return a connection to the pool, discarding any open transaction."""
+        with self._lock:
+            current = self._connections
+        if conn.pool_queue is not current:
+            # Issued before a reset(), so it may point at the previous DATABASE file
+            conn.close()
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A connection that cannot roll back is not safe to reuse; free its slot instead
+            conn.close()
+            conn = None
+        # Each issued connection owns exactly one slot, so the queue always has room for it
+        current.put_nowait(conn)
+
+    def reset(self):
+        """Close every pooled connection so the next use reconnects to DATABASE."""
+        with self._lock:
+            connections, self._connections = self._connections, None
+        while connections is not None and not connections.empty():
+            conn = connections.get_nowait()
+            if conn is not None:
+                conn.close()
+
+pool = ConnectionPool()
+
+@contextmanager
+def borrow_connection():
+    """Borrow a pooled database connection for the duration of a with-block."""
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
 def init_database():
     """Initialize the database with required tables."""
     db_conn = get_db_connection()
+    apply_pragmas(db_conn)
     
     db_conn.execute('''
         CREATE TABLE IF NOT EXISTS books (
@@ -51,6 +164,43 @@ def init_database():
             FOREIGN KEY (patron_id) REFERENCES patrons (patron_id)
         )
     ''')
+
+    # Full-text index over title/author, kept in sync with books by triggers.
+    # The trigram tokenizer keeps the case-insensitive substring matching of the LIKE search.
+    fts_exists = db_conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    db_conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5 (
+            title, author, content='books', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    if not fts_exists:
+        db_conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+    db_conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    db_conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    db_conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+
+    # Active-borrow lookup by patron and book; due_date makes it covering for the fee query.
+    # Its patron_id prefix also serves the borrow count, late-fee total and history queries.
+    db_conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_active
+        ON borrow_records (patron_id, book_id, return_date, due_date)
+    ''')
     
     db_conn.commit()
     db_conn.close()
@@ -63,40 +213,42 @@ def add_sample_data():
     if book_count == 0:
         # Add sample books
         sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
+            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3, 3),
+            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2, 2),
+            ('1984', 'George Orwell', '9780451524935', 1, 1)
         ]
         
-        for title, author, isbn, copies in sample_books:
-            conn.execute('''
+        # Seed everything in one transaction
+        with conn:
+            conn.executemany('''
                 INSERT INTO books (title, author, isbn, total_copies, available_copies)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
-        
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
+            ''', sample_books)
+            
+            # Make 1984 unavailable by adding a borrow record
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
     
     conn.close()
 
 # Helper Functions for Database Operations
 
+def iter_all_books() -> Iterator[Dict]:
+    """Yield all books from the database one at a time, holding a pooled connection until exhausted."""
+    with borrow_connection() as conn:
+        for book in conn.execute('SELECT * FROM books ORDER BY title'):
+            yield dict(book)
+
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
-    return [dict(book) for book in books]
+    return list(iter_all_books())
 
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
@@ -147,8 +299,21 @@ def get_patron_borrow_count(patron_id: str) -> int:
     conn.close()
     return count
 
+def get_borrow_context(book_id: int, patron_id: str) -> Tuple[Optional[Dict], int]:
+    """Get a book and the patron's current borrow count in one query."""
+    with borrow_connection() as conn:
+        row = conn.execute('''
+            SELECT b.title, b.available_copies,
+                   (SELECT COUNT(*) FROM borrow_records
+                    WHERE patron_id = ? AND return_date IS NULL) AS borrowed_count
+            FROM books b WHERE b.id = ?
+        ''', (patron_id, book_id)).fetchone()
+    if not row:
+        return None, 0
+    return dict(row), row['borrowed_count']
+
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
+    """Insert a new book into the database. Raises sqlite3.IntegrityError for a duplicate ISBN."""
     conn = get_db_connection()
     try:
         conn.execute('''
@@ -158,6 +323,9 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
         conn.commit()
         conn.close()
         return True
+    except sqlite3.IntegrityError:
+        conn.close()
+        raise
     except Exception as e:
         conn.close()
         return False
@@ -177,6 +345,26 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
         conn.close()
         return False
 
+def borrow_and_decrement(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
+    """
+    Take one available copy and record the loan in a single transaction.
+    Returns False if no copy was available; database failures raise sqlite3.Error.
+    """
+    with borrow_connection() as conn:
+        with conn:
+            # Guarding on available_copies makes the availability check atomic
+            updated = conn.execute('''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id = ? AND available_copies > 0
+            ''', (book_id,)).rowcount
+            if updated != 1:
+                return False
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+        return True
+
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
     conn = get_db_connection()
@@ -3,14 +3,102 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import copy
+import re
+import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_db_connection, get_patron_borrowed_books
+    get_borrow_context, insert_book, borrow_and_decrement,
+    borrow_connection, get_patron_borrowed_books, iter_all_books
 )
 
+_ISBN_RE = re.compile(r"[0-9]{13}")
+_PATRON_RE = re.compile(r"[0-9]{6}")
+
+def _is_valid_patron(patron_id: str) -> bool:
+    """Check that a patron ID is a 6-digit library card number."""
+    return bool(_PATRON_RE.fullmatch(patron_id or ""))
+
+# Hot queries kept as constants so pooled connections reuse their prepared statements
+# Whole days overdue, counted by SQLite against local time like datetime.now() - due_date.
+# Shared by the per-book and per-patron fee queries so one loan gets the same fee from both.
+_SQL_DAYS_OVERDUE = "CAST(julianday('now', 'localtime') - julianday(due_date) AS INTEGER)"
+
+_SQL_FIND_ACTIVE_BORROW = f"""
+    SELECT {_SQL_DAYS_OVERDUE} AS days_overdue
+    FROM borrow_records
+    WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+"""
+
+# Same formula as _late_fee
+_SQL_PATRON_LATE_FEES = f"""
+    SELECT COALESCE(SUM(MIN(0.5 * MIN(d, 7) + 1.0 * MAX(d - 7, 0), 15.0)), 0.0) AS fee
+    FROM (
+        SELECT MAX({_SQL_DAYS_OVERDUE}, 0) AS d
+        FROM borrow_records
+        WHERE patron_id = ? AND return_date IS NULL
+    )
+"""
+
+_SQL_PATRON_HISTORY = """
+    SELECT b.title, b.author, br.borrow_date,
+           COALESCE(br.return_date, 'This book has not yet been returned') AS return_date
+    FROM borrow_records br
+    JOIN books b ON br.book_id = b.id
+    WHERE br.patron_id = ?
+    ORDER BY br.borrow_date DESC
+"""
+
+# Title/author search through the trigram full-text index (terms of 3+ characters)
+_SQL_SEARCH_FTS = """
+    SELECT b.* FROM books_fts f
+    JOIN books b ON b.id = f.rowid
+    WHERE books_fts MATCH ?
+    ORDER BY b.title
+"""
+_FTS_MIN_TERM = 3
+
+_SQL_SEARCH_ISBN = "SELECT * FROM books WHERE isbn = ? ORDER BY title"
+
+SEARCH_TYPES = {"title", "author", "isbn"}
+
+# Recently built patron status reports, keyed by patron ID
+_PATRON_TTL = 60.0
+_patron_report_cache: Dict[str, Tuple[float, Dict]] = {}
+_patron_report_lock = threading.Lock()
+
+# Bumped by every invalidation. A report is only stored if no invalidation happened
+# while it was being built, so data read before a borrow or return is never cached.
+_patron_report_version = 0
+
+def _invalidate_patron_report(patron_id: str) -> None:
+    """Drop the cached status report for a patron whose loans changed."""
+    global _patron_report_version
+    with _patron_report_lock:
+        _patron_report_cache.pop(patron_id, None)
+        _patron_report_version += 1
+
+def clear_patron_report_cache() -> None:
+    """Drop every cached patron status report."""
+    global _patron_report_version
+    with _patron_report_lock:
+        _patron_report_cache.clear()
+        _patron_report_version += 1
+
+def _store_patron_report(patron_id: str, report: Dict, version: int) -> None:
+    """Cache a report built at the given version, pruning expired entries as it goes."""
+    with _patron_report_lock:
+        if _patron_report_version != version:
+            return
+        now = time.monotonic()
+        expired = [pid for pid, (ts, _) in _patron_report_cache.items() if now - ts >= _PATRON_TTL]
+        for pid in expired:
+            del _patron_report_cache[pid]
+        _patron_report_cache[patron_id] = (now, copy.deepcopy(report))
+
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
@@ -38,22 +126,17 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     if len(author.strip()) > 100:
         return False, "Author must be less than 100 characters."
     
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isbn.isdigit():
+    if not _ISBN_RE.fullmatch(isbn or ""):
         return False, "ISBN must be exactly 13 digits and contain only numbers."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
         return False, "Total copies must be a positive integer."
     
-    # Check for duplicate ISBN
-    existing = get_book_by_isbn(isbn)
-    if existing:
+    # Insert new book; the UNIQUE constraint on isbn rejects duplicates
+    try:
+        success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
+    except sqlite3.IntegrityError:
         return False, "A book with this ISBN already exists."
-    
-    # Insert new book
-    success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
     if success:
         return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
     else:
@@ -72,20 +155,17 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         tuple: (success: bool, message: str)
     """
     # Validate patron ID
-    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+    if not _is_valid_patron(patron_id):
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
+    # Check if book exists and is available, and patron's current borrowed books count
+    book, current_borrowed = get_borrow_context(book_id, patron_id)
     if not book:
         return False, "Book not found."
     
     if book['available_copies'] <= 0:
         return False, "This book is currently not available."
     
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
     if current_borrowed >= 5:
         return False, "You have reached the maximum borrowing limit of 5 books." ############################
     
@@ -93,52 +173,83 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(
-        patron_id, 
-        book_id, 
-        borrow_date,
-        due_date
-    )
-    
-    if not borrow_success:
+    # Insert borrow record and update availability together
+    try:
+        borrow_success = borrow_and_decrement(
+            patron_id, 
+            book_id, 
+            borrow_date,
+            due_date
+        )
+    except sqlite3.Error:
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    if not borrow_success:
+        return False, "This book is currently not available."
+
+    _invalidate_patron_report(patron_id)
     
     return True, f'Successfully borrowed "{book["title"]}". due date: {due_date.strftime("%Y-%m-%d")}.'
 
+def _late_fee(days: int) -> float:
+    """Late fee for a loan days overdue: $0.50/day for 7 days, then $1.00/day, capped at $15."""
+    if days <= 0:
+        return 0.0
+    return round(min(0.5 * min(days, 7) + 1.0 * max(days - 7, 0), 15.0), 2)
+
+def _compute_fee(days_overdue: int) -> Dict:
+    """Build the late fee result for a loan that is days_overdue days late."""
+    if days_overdue <= 0:
+        return {
+            'fee_amount': 0.00,
+            'days_overdue': 0,
+            'status': 'Returned on time'
+        }
+
+    return {
+        'fee_amount': _late_fee(days_overdue),
+        'days_overdue': days_overdue,
+        'status': 'Late fee calculated successfully'
+    }
+
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
-    if not patron_id or not patron_id.isdigit() or len(patron_id) !=6:
+    if not _is_valid_patron(patron_id):
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
+    with borrow_connection() as db_conn:
+        book = db_conn.execute("SELECT title FROM books WHERE id = ?", (book_id,)).fetchone()
+        if not book:
+            return False, "Book not found."
 
-    db_conn = get_db_connection()
-    full_record = db_conn.execute("""
-        SELECT * FROM borrow_records
-        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-    """, (patron_id, book_id)).fetchone()
-    db_conn.close()
+        full_record = db_conn.execute(_SQL_FIND_ACTIVE_BORROW, (patron_id, book_id)).fetchone()
 
-    if not full_record:
-        return False, "This book was not borrowed by this patron or has already been returned."
-    
-    fee = calculate_late_fee_for_book(patron_id, book_id)
+        if not full_record:
+            return False, "This book was not borrowed by this patron or has already been returned."
 
-    update = update_borrow_record_return_date(patron_id, book_id, datetime.now())
-    if not update:
-        return False, "There is no record of this borrowed book from this patron ID"
+        current_date = datetime.now()
+        fee = _compute_fee(full_record["days_overdue"])
 
-    update_book_availability(book_id, +1)
-    
-    return True, f'Book "{book["title"]}" has been returned successfully. Late fee: ${fee["fee_amount"]:.2f}'
+        # Close the borrow record and release the copy in a single transaction
+        try:
+            with db_conn:
+                update = db_conn.execute("""
+                    UPDATE borrow_records
+                    SET return_date = ?
+                    WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                """, (current_date.isoformat(), patron_id, book_id))
+                if update.rowcount == 0:
+                    return False, "There is no record of this borrowed book from this patron ID"
 
+                db_conn.execute("""
+                    UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+                """, (book_id,))
+        except sqlite3.Error:
+            return False, "Database error occurred while processing the return."
+
+    _invalidate_patron_report(patron_id)
+
+    return True, f'Book "{book["title"]}" has been returned successfully. Late fee: ${fee["fee_amount"]:.2f}'
     
 
     """
@@ -149,41 +260,32 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     return False, "Book return functionality is not yet implemented."
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
-    db_conn = get_db_connection()
-
-    query_record = db_conn.execute("""
-        SELECT due_date
-        FROM borrow_records
-        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-    """, (patron_id, book_id)).fetchone()
-    db_conn.close()
+    # Reject malformed input before it reaches the database
+    if not _is_valid_patron(patron_id):
+        return {
+            'fee_amount': 0.00,
+            'days_overdue': 0,
+            'status': 'Invalid patron ID'
+        }
 
-    if not query_record:
+    if isinstance(book_id, bool) or not isinstance(book_id, int) or book_id <= 0:
         return {
             'fee_amount': 0.00,
             'days_overdue': 0,
             'status': 'Book cannot be found'
         }
 
-    due_date = datetime.fromisoformat(query_record['due_date'])
-    current_date = datetime.now()
-    days_overdue = (current_date - due_date).days
+    with borrow_connection() as db_conn:
+        query_record = db_conn.execute(_SQL_FIND_ACTIVE_BORROW, (patron_id, book_id)).fetchone()
 
-    if days_overdue <= 0:
+    if not query_record:
         return {
             'fee_amount': 0.00,
             'days_overdue': 0,
-            'status': 'Returned on time'
+            'status': 'Book cannot be found'
         }
 
-    first_week_late_fee = min(days_overdue, 7) * 0.5
-    additional_late_fee = max(days_overdue - 7, 0) * 1.0
-    late_fee = min(first_week_late_fee + additional_late_fee, 15.0)
-    return {
-        'fee_amount': round(late_fee, 2),
-        'days_overdue': days_overdue,
-        'status': 'Late fee calculated successfully'
-    }
+    return _compute_fee(query_record['days_overdue'])
 
     """
     Calculate late fees for a specific book.
@@ -200,19 +302,26 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
 
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
 
-    results = []
-    search_for_term = search_term.strip().lower()
-    every_books = get_all_books()
+    if search_type not in SEARCH_TYPES:
+        return []
+
+    search_for_term = search_term.strip()
+
+    if search_type == "isbn":
+        query, parameter = _SQL_SEARCH_ISBN, search_for_term
+    elif len(search_for_term) >= _FTS_MIN_TERM:
+        # A quoted phrase restricted to one column is a substring match under trigram
+        phrase = search_for_term.replace('"', '""')
+        query, parameter = _SQL_SEARCH_FTS, f'{search_type} : "{phrase}"'
+    else:
+        # Too short for trigrams; fold case in Python, since SQLite's LIKE only folds ASCII
+        lowered = search_for_term.lower()
+        return [book for book in iter_all_books() if lowered in book[search_type].lower()]
 
-    for books in every_books:
-        if search_type == "title" and search_for_term in books["title"].lower():
-            results.append(books)
-        elif search_type == "author" and search_for_term in books["author"].lower():
-            results.append(books)
-        elif search_type == "isbn" and search_for_term == books["isbn"].lower():
-            results.append(books)
+    with borrow_connection() as conn:
+        rows = conn.execute(query, (parameter,)).fetchall()
 
-    return results
+    return [dict(row) for row in rows]
 
 
     """
@@ -223,7 +332,7 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
 
 def get_patron_status_report(patron_id: str) -> Dict:
 
-    if not patron_id or not patron_id.isdigit() or len(patron_id) !=6:
+    if not _is_valid_patron(patron_id):
           return {
             "patron_id": patron_id,
             "currently_borrowed": 0,
@@ -234,36 +343,21 @@ def get_patron_status_report(patron_id: str) -> Dict:
             "status": "Invalid ID"
         }
     
+    with _patron_report_lock:
+        cached = _patron_report_cache.get(patron_id)
+        version = _patron_report_version
+    if cached and time.monotonic() - cached[0] < _PATRON_TTL:
+        # Hand out a copy so one caller's changes never leak into later reports
+        return copy.deepcopy(cached[1])
+
     current_books = get_patron_borrowed_books(patron_id)
     num_of_current_books = len(current_books)
-    current_date = datetime.now().date()    
 
+    with borrow_connection() as conn:
+        late_fee = conn.execute(_SQL_PATRON_LATE_FEES, (patron_id,)).fetchone()["fee"]
+        rows = conn.execute(_SQL_PATRON_HISTORY, (patron_id,)).fetchall()
 
-    late_fee = 0.0
-    for i in current_books:
-        due = i["due_date"].date()
-        days_overdue  = max(0, (current_date-due).days)
-        if days_overdue > 0:
-            late_fee += min(days_overdue * 0.5, 15.0)
-    
-    conn = get_db_connection()
-    rows = conn.execute("""
-        SELECT b.title, b.author, br.borrow_date, br.return_date
-        FROM borrow_records br
-        JOIN books b ON br.book_id = b.id
-        WHERE br.patron_id = ?
-        ORDER BY br.borrow_date DESC
-    """, (patron_id,)).fetchall()
-    conn.close()
-
-    full_history = []
-    for row in rows:
-        full_history.append({
-            "title": row["title"],
-            "author": row["author"],
-            "borrow_date": row["borrow_date"],
-            "return_date": row["return_date"] or "This book has not yet been returned"
-        })
+    full_history = [dict(row) for row in rows]
 
     report_on_patron = {
         "patron_id" : patron_id,
@@ -275,6 +369,8 @@ def get_patron_status_report(patron_id: str) -> Dict:
         "status" : "Active" if num_of_current_books < 5 else "At borrowing limit"
     }
 
+    _store_patron_report(patron_id, report_on_patron, version)
+
     return report_on_patron
 
     """
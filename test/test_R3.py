@@ -1,6 +1,6 @@
 import pytest
 from library_service import borrow_book_by_patron, add_book_to_catalog
-from database import get_book_by_isbn
+from database import get_book_by_isbn, get_db_connection
 
 def add_book(isbn: str, copies: int = 1):
     add_book_to_catalog("Hardy Boys", "Pam", isbn, copies) 
@@ -62,5 +62,15 @@ def test_limit_books_borrowed():
     result, output = borrow_book_by_patron("999999", sixth_book["id"])
     assert not result
     assert "max" in output.lower() or "limit" in output.lower()
-  
 
+def test_database_error_is_not_reported_as_unavailable():
+    test_book = add_book("3000000000011", copies=1)
+    conn = get_db_connection()
+    conn.execute("CREATE TRIGGER fail_borrow BEFORE INSERT ON borrow_records BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    conn.commit()
+    conn.close()
+
+    result, output = borrow_book_by_patron("123456", test_book["id"])
+    assert not result
+    assert "database error" in output.lower()
+    assert get_book_by_isbn("3000000000011")["available_copies"] == 1
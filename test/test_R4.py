@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime, timedelta
 from library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron
 from database import get_book_by_isbn, get_book_by_id, insert_borrow_record
 
@@ -77,4 +78,13 @@ def test_book_not_borrowed_record():
     result, output = return_book_by_patron("123456", test_book["id"])
 
     assert not result
-    assert "no record" in output.lower() or "not borrowed" in output.lower()
\ No newline at end of file
+    assert "no record" in output.lower() or "not borrowed" in output.lower()
+
+def test_return_overdue_datetime_loan_charges_fee():
+    test_book = add_book("1928281392011", copies=1)
+    due = datetime.now() - timedelta(days=10, hours=1)
+    assert insert_borrow_record("124522", test_book["id"], due - timedelta(days=14), due)
+
+    result, output = return_book_by_patron("124522", test_book["id"])
+    assert result
+    assert "Late fee: $6.50" in output
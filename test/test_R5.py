@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime, timedelta
 from library_service import add_book_to_catalog, calculate_late_fee_for_book
 from database import get_book_by_isbn, insert_borrow_record
 
@@ -47,4 +48,31 @@ def test_fee_invalid_book_id():
     fee_info = calculate_late_fee_for_book("123456", 122343)
     assert fee_info["fee_amount"] == 0.00
     assert fee_info["days_overdue"] == 0
-    assert "Book cannot be found" in fee_info["status"]
\ No newline at end of file
+    assert "Book cannot be found" in fee_info["status"]
+
+def test_fee_invalid_patron_id():
+    for pid in ["", "12345", "12a456", "1234567"]:
+        fee_info = calculate_late_fee_for_book(pid, 1)
+        assert fee_info["fee_amount"] == 0.00
+        assert fee_info["days_overdue"] == 0
+        assert "invalid" in fee_info["status"].lower()
+
+def test_fee_invalid_book_id_type_or_value():
+    for book_id in [0, -1, "1", True]:
+        fee_info = calculate_late_fee_for_book("123456", book_id)
+        assert fee_info["fee_amount"] == 0.00
+        assert fee_info["days_overdue"] == 0
+        assert "Book cannot be found" in fee_info["status"]
+
+def test_fee_overdue_datetime_loans():
+    now = datetime.now()
+    for i, (days, fee) in enumerate([(3, 1.50), (7, 3.50), (10, 6.50), (40, 15.00)]):
+        patron = f"52000{i}"
+        test_book = add_book(f"183748281330{i}")
+        due = now - timedelta(days=days, hours=1)
+        assert insert_borrow_record(patron, test_book["id"], due - timedelta(days=14), due)
+
+        fee_info = calculate_late_fee_for_book(patron, test_book["id"])
+        assert fee_info["days_overdue"] == days
+        assert fee_info["fee_amount"] == fee
+        assert fee_info["status"] == "Late fee calculated successfully"
@@ -42,4 +42,11 @@ def test_search_all_fields():
     assert len(results) >= 1
     row = results[0]
     for i in ["id", "title", "author", "isbn", "available_copies", "total_copies"]:
-        assert i in row
\ No newline at end of file
+        assert i in row
+
+def test_search_folds_non_ascii_case():
+    test_book = add_book("Éclair Recipes", "Ñoño Pérez", "1283920129220")
+
+    for term, search_type in [("éc", "title"), ("ÉCLAIR", "title"), ("ño", "author"), ("ÑOÑO", "author")]:
+        results = search_books_in_catalog(term, search_type)
+        assert test_book["id"] in [i["id"] for i in results]
@@ -1,5 +1,7 @@
 import pytest
-from library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron, get_patron_status_report
+import library_service
+from datetime import date, datetime, time, timedelta
+from library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron, get_patron_status_report, calculate_late_fee_for_book
 from database import get_book_by_isbn, insert_borrow_record
 
 def add_book(title, author, isbn, copies = 1):
@@ -63,4 +65,62 @@ def test_bad_patron_id_handler():
             for i in ["current_loans", "total_late_fees", "borrowed_count", "history"]:
                 assert i in status
         else:
-            assert status is not None
\ No newline at end of file
+            assert status is not None
+
+def test_total_late_fees_after_first_week():
+    patron = "481516"
+    test_book = add_book("Aquaman", "Arthur", "1283819301933")
+    now = datetime.now()
+    assert insert_borrow_record(patron, test_book["id"], now - timedelta(days=24), now - timedelta(days=10))
+
+    status = get_patron_status_report(patron)
+    assert float(status["total_late_fees"]) == 6.50
+
+def test_cached_report_is_not_shared_between_callers():
+    patron = "623415"
+    test_book = add_book("Flash", "Barry", "1283819301934")
+    assert borrow_book_by_patron(patron, test_book["id"])[0]
+
+    first = get_patron_status_report(patron)
+    first["history"].clear()
+    first["current_loans"].clear()
+
+    second = get_patron_status_report(patron)
+    assert [i["title"] for i in second["history"]] == ["Flash"]
+    assert [i["title"] for i in second["current_loans"]] == ["Flash"]
+
+def test_report_built_before_a_borrow_is_not_cached(monkeypatch):
+    patron = "623416"
+    test_book = add_book("Cyborg", "Victor", "1283819301935")
+    read_loans = library_service.get_patron_borrowed_books
+
+    def borrow_while_building(patron_id):
+        # Another request borrows a book after this report has read the patron's loans
+        loans = read_loans(patron_id)
+        assert borrow_book_by_patron(patron_id, test_book["id"])[0]
+        return loans
+
+    monkeypatch.setattr(library_service, "get_patron_borrowed_books", borrow_while_building)
+    assert get_patron_status_report(patron)["borrowed_count"] == 0
+    monkeypatch.setattr(library_service, "get_patron_borrowed_books", read_loans)
+
+    assert get_patron_status_report(patron)["borrowed_count"] == 1
+
+def test_report_fee_matches_per_book_fee():
+    midnight = datetime.combine(date.today(), time())
+    now = datetime.now()
+    due_dates = [
+        midnight - timedelta(minutes=1),  # due late yesterday: under a full day overdue
+        now - timedelta(hours=23),
+        now - timedelta(days=3, hours=1),
+        now - timedelta(days=9, hours=23),
+        now - timedelta(days=40),
+    ]
+    for i, due in enumerate(due_dates):
+        patron = f"71000{i}"
+        test_book = add_book(f"Loan {i}", "Clock", f"128381930200{i}")
+        assert insert_borrow_record(patron, test_book["id"], due - timedelta(days=14), due)
+
+        per_book = calculate_late_fee_for_book(patron, test_book["id"])
+        report = get_patron_status_report(patron)
+        assert report["total_late_fees"] == per_book["fee_amount"]
@@ -8,14 +8,7 @@ from library_service import (
     search_books_in_catalog,
     get_patron_status_report,
 )
-from database import init_database, add_sample_data, get_all_books
-
-
-@pytest.fixture(scope="session", autouse=True)
-def database_initializer():
-    """Reset and seed the local dataset for AI verification."""
-    init_database()
-    add_sample_data()
+from database import get_all_books
 
 
 # =====================================================